@@ -5,8 +5,13 @@ import cv2
 import numpy as np
 import mediapipe as mp
 import time
-from threading import Thread
+import os
+import atexit
+from threading import Thread, Lock, get_ident
 import queue
+from gesture_classifier import TreeGestureClassifier, DIGITS
+from profiler import SamplingProfiler, PROFILE_SECONDS
+from event_log import EventLog, new_session_id
 
 # Global variables for state management
 if 'expression' not in st.session_state:
@@ -26,6 +31,12 @@ mp_hands = mp.solutions.hands
 GESTURE_BUFFER_SIZE = 3
 MOVEMENT_THRESHOLD = 0.03
 
+# Capture constraints sent to the browser and server-side processing rate
+CAPTURE_RESOLUTIONS = {"320x240": (320, 240), "640x480": (640, 480), "1280x720": (1280, 720)}
+CAPTURE_RESOLUTION = "640x480"
+CAPTURE_FPS = 15
+TARGET_PROCESS_FPS = 10
+
 # Session state for debouncing and stability
 if 'last_gestures' not in st.session_state:
     st.session_state.last_gestures = []
@@ -106,6 +117,18 @@ def detect_gesture(hand1_data, hand2_data):
         return "clear"
     return None
 
+@st.cache_resource
+def get_event_log():
+    """One background event writer shared by all sessions of this process"""
+    event_log = EventLog()
+    atexit.register(event_log.close)
+    return event_log
+
+@st.cache_resource
+def get_classifier(path, mtime):
+    """Load a trained gesture model once per file version; failures raise and are not cached"""
+    return TreeGestureClassifier.load(path)
+
 class MathSolverTransformer(VideoTransformerBase):
     def __init__(self):
         self.hands = mp_hands.Hands(
@@ -114,6 +137,67 @@ class MathSolverTransformer(VideoTransformerBase):
             min_tracking_confidence=0.85
         )
         self.delay = 1.25
+        self.classifier = None  # None uses the rule-based recognizer
+        self.target_fps = TARGET_PROCESS_FPS
+        self._next_due = 0.0
+        self._stats_lock = Lock()
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0    # Shed because newer frames arrived while processing
+        self.decimated = 0  # Skipped to stay at the target processing rate
+        self.transform_ms = 0.0  # Moving average for display
+        self.busy_time = 0.0     # Total seconds spent in transform()
+        self.thread_id = None  # Thread running recognition, set on the first frame
+        self.profiler = SamplingProfiler()
+        self.events = None      # EventRecorder for this browser session
+        self.started_at = None  # Time of the first token of the current expression
+    def stats(self):
+        """Snapshot of this session's frame counters"""
+        with self._stats_lock:
+            return {
+                "received": self.received,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "decimated": self.decimated,
+                "transform_ms": self.transform_ms,
+                "busy_time": self.busy_time,
+            }
+    async def recv_queued(self, frames):
+        """Process only the newest queued frame, at most target_fps times a second"""
+        now = time.monotonic()
+        frame = frames[-1]
+        self.thread_id = get_ident()
+        with self._stats_lock:
+            self.received += len(frames)
+            self.dropped += len(frames) - 1
+            decimate = now < self._next_due
+            if decimate:
+                self.decimated += 1
+            else:
+                self._next_due = max(self._next_due + 1.0 / self.target_fps, now)
+        if decimate:
+            # Pass the frame through without recognition so the video stays smooth
+            img = cv2.flip(frame.to_ndarray(format="bgr24"), 1)
+            self.draw_status(img)
+            return [av.VideoFrame.from_ndarray(img, format="bgr24")]
+        start = time.perf_counter()
+        img = self.transform(frame)
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self.processed += 1
+            self.busy_time += elapsed / 1000
+            self.transform_ms = elapsed if self.processed == 1 else 0.9 * self.transform_ms + 0.1 * elapsed
+        return [av.VideoFrame.from_ndarray(img, format="bgr24")]
+    def log_gesture(self, token):
+        """Record an accepted gesture in the event log"""
+        if self.events is not None:
+            self.events.gesture(token, st.session_state.expression)
+    def draw_status(self, img):
+        """Draw the current expression and result onto a frame"""
+        cv2.putText(img, f'Expression: {st.session_state.expression}', 
+                   (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 0, 0), 2)
+        cv2.putText(img, f'Result: {st.session_state.result}', 
+                   (10, 100), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
     def transform(self, frame):
         img = frame.to_ndarray(format="bgr24")
         img = cv2.flip(img, 1)
@@ -127,10 +211,18 @@ class MathSolverTransformer(VideoTransformerBase):
                 label = hand_handedness.classification[0].label
                 hand_data.append((hand_landmarks, label))
                 mp_drawing.draw_landmarks(img, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-            # Single hand detection for digits 0-5
+            # Single hand detection for digits (0-5 by rules, 0-9 by a trained model)
+            gesture = None
             if len(hand_data) == 1:
                 hand_landmarks, label = hand_data[0]
-                fingers_up = count_fingers(hand_landmarks, label)
+                if self.classifier is not None:
+                    fingers_up = self.classifier.classify_frame(hand_data)
+                    if fingers_up is not None and fingers_up not in DIGITS:
+                        # A trained model's other one-hand labels (operators, commands)
+                        # are debounced like the two-hand ones
+                        gesture, fingers_up = fingers_up, None
+                else:
+                    fingers_up = count_fingers(hand_landmarks, label)
                 # Calculate hand movement
                 hand_center = hand_landmarks.landmark[0]
                 if st.session_state.last_hand_pos is not None:
@@ -138,16 +230,23 @@ class MathSolverTransformer(VideoTransformerBase):
                 else:
                     movement = 0
                 st.session_state.last_hand_pos = (hand_center.x, hand_center.y)
-                if (fingers_up in [0, 1, 2, 3, 4, 5] and
+                if (fingers_up is not None and
                     current_time - st.session_state.last_update_time > self.delay and
                     movement < MOVEMENT_THRESHOLD):
                     if st.session_state.last_digit != fingers_up:
                         st.session_state.last_digit = fingers_up
                         st.session_state.last_update_time = current_time
+                        if self.started_at is None:
+                            self.started_at = current_time
                         st.session_state.expression += str(fingers_up)
+                        self.log_gesture(fingers_up)
             # Two hand detection for operations and multi-digit numbers
             if len(hand_data) == 2:
-                gesture = detect_gesture(hand_data[0], hand_data[1])
+                if self.classifier is not None:
+                    gesture = self.classifier.classify_frame(hand_data)
+                else:
+                    gesture = detect_gesture(hand_data[0], hand_data[1])
+            if len(hand_data) == 2 or gesture is not None:
                 st.session_state.last_gestures.append(gesture)
                 if len(st.session_state.last_gestures) > GESTURE_BUFFER_SIZE:
                     st.session_state.last_gestures.pop(0)
@@ -156,34 +255,45 @@ class MathSolverTransformer(VideoTransformerBase):
                     if gesture == "clear":
                         st.session_state.expression = ""
                         st.session_state.result = ""
+                        self.started_at = None
+                        self.log_gesture(gesture)
                     elif gesture == "del":
                         st.session_state.expression = st.session_state.expression[:-1]
+                        self.log_gesture(gesture)
                     elif gesture == "=":
                         try:
                             st.session_state.result = str(eval(st.session_state.expression))
+                            ok = True
                             Thread(target=speak, args=(f"Result is {st.session_state.result}",)).start()
                         except:
                             st.session_state.result = "Error"
+                            ok = False
+                        if self.events is not None:
+                            duration = current_time - self.started_at if self.started_at is not None else None
+                            self.events.result(st.session_state.expression, st.session_state.result, ok, duration)
+                        self.started_at = None
                     elif gesture == "exit":
+                        self.log_gesture(gesture)
                         st.session_state.expression = ""
                         st.session_state.result = ""
+                        self.started_at = None
                         st.session_state.last_gestures = []
                         st.session_state.last_digit = None
                         st.session_state.last_hand_pos = None
                         st.session_state.last_update_time = current_time
                         # Optionally, you can add a message or stop the stream
                     else:
+                        if self.started_at is None:
+                            self.started_at = current_time
                         st.session_state.expression += gesture
+                        self.log_gesture(gesture)
                     st.session_state.last_update_time = current_time
                     st.session_state.last_gestures = []
         else:
             st.session_state.last_hand_pos = None
             st.session_state.last_digit = None
             st.session_state.last_gestures = []
-        cv2.putText(img, f'Expression: {st.session_state.expression}', 
-                   (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 0, 0), 2)
-        cv2.putText(img, f'Result: {st.session_state.result}', 
-                   (10, 100), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
+        self.draw_status(img)
         return img
 
 def main():
@@ -226,6 +336,33 @@ def main():
         - Position hands at comfortable distance
         """)
         
+        st.header("🧠 Recognizer")
+        recognizer = st.radio("Gesture recognizer", ["Rules", "Trained model"])
+        model_path = st.text_input("Model file", os.environ.get("GESTURE_MODEL", "gesture_model.npz"))
+        classifier = None
+        if recognizer == "Trained model":
+            try:
+                classifier = get_classifier(model_path, os.path.getmtime(model_path))
+            except Exception as e:
+                st.warning(f"Model not available ({e}), using rules")
+        
+        st.header("⚙️ Performance")
+        resolution = st.selectbox("Camera resolution", list(CAPTURE_RESOLUTIONS),
+                                  index=list(CAPTURE_RESOLUTIONS).index(CAPTURE_RESOLUTION),
+                                  help="Applied when the camera is (re)started")
+        capture_fps = st.slider("Camera frame rate", 5, 30, CAPTURE_FPS,
+                                help="Applied when the camera is (re)started")
+        process_fps = st.slider("Recognition rate (fps)", 1, 30, TARGET_PROCESS_FPS,
+                                help="Frames above this rate are shown without recognition")
+        
+        # Switch the toggle back off once the sampling window has ended
+        profiler = st.session_state.get("profiler")
+        if profiler is not None and not profiler.running:
+            st.session_state.profiler = None
+            st.session_state.profile = False
+        profile = st.toggle(f"🔬 Profile recognition ({PROFILE_SECONDS:.0f}s)", key="profile",
+                            help="Samples the recognition thread and writes a flamegraph-ready .folded file")
+        
         # Clear button
         if st.button("🗑️ Clear All"):
             st.session_state.expression = ""
@@ -243,9 +380,30 @@ def main():
             rtc_configuration={
                 "iceServers": [{"urls": ["stun:stun.l.google.com:19302"]}]
             },
-            media_stream_constraints={"video": True, "audio": False},
+            media_stream_constraints={
+                "video": {
+                    "width": {"ideal": CAPTURE_RESOLUTIONS[resolution][0]},
+                    "height": {"ideal": CAPTURE_RESOLUTIONS[resolution][1]},
+                    "frameRate": {"ideal": capture_fps, "max": capture_fps},
+                },
+                "audio": False,
+            },
             async_processing=True,
         )
+        if webrtc_ctx.video_processor:
+            webrtc_ctx.video_processor.classifier = classifier
+            webrtc_ctx.video_processor.target_fps = process_fps
+            if webrtc_ctx.video_processor.events is None:
+                if "session_id" not in st.session_state:
+                    st.session_state.session_id = new_session_id()
+                webrtc_ctx.video_processor.events = get_event_log().recorder(st.session_state.session_id)
+            processor = webrtc_ctx.video_processor
+            if not profile and st.session_state.get("profiler") is not None:
+                st.session_state.profiler.stop()
+                st.session_state.profiler = None
+            elif profile and st.session_state.get("profiler") is None and processor.thread_id is not None:
+                processor.profiler.start(processor.thread_id)
+                st.session_state.profiler = processor.profiler
     
     with col2:
         st.header("📊 Current Status")
@@ -266,6 +424,22 @@ def main():
             st.success("✅ Camera Active")
         else:
             st.warning("⏸️ Camera Paused")
+        
+        if webrtc_ctx.video_processor:
+            stats = webrtc_ctx.video_processor.stats()
+            st.subheader("Frames:")
+            frame_cols = st.columns(4)
+            frame_cols[0].metric("Received", stats["received"])
+            frame_cols[1].metric("Processed", stats["processed"])
+            frame_cols[2].metric("Dropped", stats["dropped"])
+            frame_cols[3].metric("Skipped", stats["decimated"])
+            st.caption(f"Recognition time: {stats['transform_ms']:.0f} ms per frame")
+            if webrtc_ctx.video_processor.profiler.running:
+                st.info("🔬 Profiling recognition...")
+            elif webrtc_ctx.video_processor.profiler.last_output:
+                st.caption(f"Last profile: {webrtc_ctx.video_processor.profiler.last_output}")
+            if st.button("🔄 Refresh"):
+                st.rerun()
     
     # Footer
     st.markdown("---")
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Session event log for Hand Gesture Math Solver
+Gesture, expression and result events are buffered in memory and written
+to a local SQLite database (WAL mode) in batched transactions by a
+background thread, so the frame loop never waits on disk
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+
+EVENT_DB = "events.db"
+FLUSH_INTERVAL = 1.0   # Seconds between flushes when the buffer is not full
+BATCH_SIZE = 1000      # Events per transaction; a full batch wakes the writer early
+MAX_BUFFER = 100000    # Events kept in memory before new ones are dropped
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    user INTEGER,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    token TEXT,
+    expression TEXT,
+    result TEXT,
+    ok INTEGER,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS idx_events_session_ts ON events(session, user, ts);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts);
+CREATE INDEX IF NOT EXISTS idx_events_kind_token ON events(kind, token);
+"""
+
+INSERT = ("INSERT INTO events (session, user, ts, kind, token, expression, result, ok, duration) "
+          "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+def new_session_id():
+    """Random identifier for one app run or browser session"""
+    return uuid.uuid4().hex
+
+def connect(path):
+    """Open the event database in WAL mode and make sure the schema exists"""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+class EventLog:
+    """In-memory event buffer flushed to SQLite by a background thread"""
+
+    def __init__(self, path=EVENT_DB, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE, max_buffer=MAX_BUFFER):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.written = 0
+        self.dropped = 0       # Events rejected when full or closed, or lost to a failed write
+        self._buffer = deque()
+        self._lock = threading.Lock()  # Guards dropped and _closed against concurrent log() calls
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, session, user, kind, token=None, expression=None, result=None, ok=None, duration=None):
+        """Queue one event; never blocks on disk. Events after close() are dropped"""
+        with self._lock:
+            if self._closed or len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                return
+            self._buffer.append((session, user, time.time(), kind, token, expression, result, ok, duration))
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def recorder(self, session, user=None):
+        """Event recorder bound to one session and user"""
+        return EventRecorder(self, session, user)
+
+    def close(self, timeout=5.0):
+        """Write everything still buffered and stop the writer thread"""
+        with self._lock:
+            self._closed = True
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            conn = connect(self.path)
+        except sqlite3.Error as e:
+            print(f"Event log error: {e}")
+            return
+        try:
+            while not self._closed:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                self._flush(conn)
+            self._flush(conn)
+        finally:
+            conn.close()
+
+    def _flush(self, conn):
+        """Write buffered events in transactions of at most batch_size rows"""
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(len(self._buffer), self.batch_size))]
+            try:
+                with conn:
+                    conn.executemany(INSERT, batch)
+                self.written += len(batch)
+            except sqlite3.Error as e:
+                with self._lock:
+                    self.dropped += len(batch)
+                print(f"Event log error: {e}")
+
+class EventRecorder:
+    """Records the events of one user in one session"""
+
+    def __init__(self, log, session, user=None):
+        self.log = log
+        self.session = session
+        self.user = user
+
+    def gesture(self, token, expression):
+        """An accepted digit, operator, delete, clear or exit gesture"""
+        self.log.log(self.session, self.user, "gesture", token=str(token), expression=expression)
+
+    def result(self, expression, result, ok, duration=None):
+        """An evaluation of the expression; duration is seconds since its first token"""
+        self.log.log(self.session, self.user, "result", token="=", expression=expression,
+                     result=result, ok=int(ok), duration=duration)
+
+def error_rate_per_gesture(conn, since=0.0):
+    """(token, count, error_rate) per gesture, highest error rate first
+
+    A gesture counts as an error when the user's next accepted gesture
+    deletes or clears it; an evaluation counts as an error when it fails.
+    """
+    return conn.execute("""
+        WITH seq AS (
+            SELECT token,
+                   CASE WHEN kind = 'result' THEN ok = 0
+                        ELSE COALESCE(LEAD(token) OVER w IN ('del', 'clear'), 0) END AS error
+            FROM events
+            WHERE ts >= ?
+            WINDOW w AS (PARTITION BY session, user ORDER BY ts, id)
+        )
+        SELECT token, COUNT(*), AVG(error) AS error_rate
+        FROM seq
+        WHERE token NOT IN ('del', 'clear', 'exit')
+        GROUP BY token
+        ORDER BY error_rate DESC, token
+    """, (since,)).fetchall()
+
+def mean_time_to_enter(conn, since=0.0, limit=20):
+    """(expression, count, mean seconds from first token to result) for successful evaluations"""
+    return conn.execute("""
+        SELECT expression, COUNT(*), AVG(duration)
+        FROM events
+        WHERE kind = 'result' AND ok = 1 AND duration IS NOT NULL AND ts >= ?
+        GROUP BY expression
+        ORDER BY COUNT(*) DESC, expression
+        LIMIT ?
+    """, (since, limit)).fetchall()
+
+def print_report(path, hours=None):
+    """Print usage analytics from an event database"""
+    since = time.time() - hours * 3600 if hours else 0.0
+    conn = connect(path)
+    try:
+        sessions, events = conn.execute(
+            "SELECT COUNT(DISTINCT session), COUNT(*) FROM events WHERE ts >= ?", (since,)).fetchone()
+        print(f"📊 {events} events from {sessions} sessions")
+        print("\nError rate per gesture:")
+        for token, count, rate in error_rate_per_gesture(conn, since):
+            print(f"  {token:>6}: {rate:6.1%} of {count}")
+        print("\nMean time to enter (successful evaluations):")
+        for expression, count, duration in mean_time_to_enter(conn, since):
+            print(f"  {expression:>16}: {duration:5.1f}s over {count}")
+    finally:
+        conn.close()
+
+def benchmark(events=200000, batch_size=BATCH_SIZE):
+    """Measure producer cost per event and writer throughput at a high event rate"""
+    with tempfile.TemporaryDirectory() as tmp:
+        log = EventLog(os.path.join(tmp, "bench.db"), batch_size=batch_size, max_buffer=events)
+        recorder = log.recorder(new_session_id(), 1)
+        tokens = "0123456789+-*/"
+
+        start = time.perf_counter()
+        for i in range(events):
+            recorder.gesture(tokens[i % len(tokens)], "12+3")
+        produced = time.perf_counter() - start
+        log.close(timeout=None)
+        total = time.perf_counter() - start
+
+        print(f"Logged {events} events: {produced / events * 1e6:.2f} µs per log() call")
+        print(f"Flushed {log.written} events in {total:.2f}s: {log.written / total:,.0f} events/s "
+              f"(batch size {batch_size}, {log.dropped} dropped)")
+
+        conn = connect(log.path)
+        start = time.perf_counter()
+        error_rate_per_gesture(conn)
+        print(f"Error rate query over {log.written} events: {(time.perf_counter() - start) * 1000:.1f} ms")
+        conn.close()
+
+def main():
+    """Command line entry point for reports and benchmarks"""
+    parser = argparse.ArgumentParser(description="Query or benchmark the session event log")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="print usage analytics")
+    rep.add_argument("db", nargs="?", default=EVENT_DB)
+    rep.add_argument("--hours", type=float, default=None, help="only events from the last N hours")
+    bench = sub.add_parser("bench", help="benchmark logging and flush throughput")
+    bench.add_argument("--events", type=int, default=200000)
+    bench.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        print_report(args.db, args.hours)
+    else:
+        benchmark(args.events, args.batch_size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Trainable landmark gesture classifier for Hand Gesture Math Solver
+Record labeled frames, train a decision tree on normalized finger features
+and classify whole frames (or batches of frames) in one call. Training and
+batch prediction use NumPy; a single frame is one short walk down the tree.
+"""
+
+import argparse
+import os
+import time
+from math import hypot
+import numpy as np
+
+NUM_LANDMARKS = 21
+TIP_IDS = (4, 8, 12, 16, 20)    # Thumb, index, middle, ring and pinky tips
+JOINT_IDS = (3, 6, 10, 14, 18)  # Joint each tip is compared with, as in count_fingers
+# Per hand: five finger extensions, extended finger count, thumb-index pinch gap and index tip direction
+HAND_FEATURES = 8
+_EMPTY_HAND_POINTS = [0.0] * NUM_LANDMARKS * 3
+# A row holds two hand slots (left, right), presence flags, and the right-minus-left
+# index tip offset and distance; a one-hand frame ends in an empty right slot,
+# presence flags and zero pair features
+_ONE_HAND_TAIL = [0.0] * HAND_FEATURES + [1.0, 0.0, 0.0, 0.0]
+
+# Labels that are commands rather than text appended to the expression
+COMMANDS = ("=", "del", "clear", "exit")
+# One-hand labels taken on the digit path; every other label is debounced
+DIGITS = tuple("0123456789")
+
+# Keys used while recording samples and the gesture label each one stores
+RECORD_KEYS = {
+    **{ord(str(d)): str(d) for d in range(10)},
+    ord('+'): "+",
+    ord('-'): "-",
+    ord('*'): "*",
+    ord('/'): "/",
+    ord('='): "=",
+    ord('('): "(",
+    ord(')'): ")",
+    ord('.'): ".",
+    ord('^'): "**",
+    ord('d'): "del",
+    ord('c'): "clear",
+    ord('x'): "exit",
+}
+
+def hands_to_arrays(frames):
+    """Convert lists of (hand_landmarks, label) into point and side arrays
+
+    Sides are -1 for a left hand, 1 for a right hand and 0 for an empty slot.
+    Frames without exactly one or two hands get two empty slots.
+    """
+    coords = []
+    sides = []
+    for hand_data in frames:
+        if len(hand_data) not in (1, 2):
+            hand_data = ()
+        for hand_landmarks, label in hand_data:
+            coords.extend([c for lm in hand_landmarks.landmark for c in (lm.x, lm.y, lm.z)])
+            sides.append(-1 if label == "Left" else 1)
+        for _ in range(2 - len(hand_data)):
+            coords.extend(_EMPTY_HAND_POINTS)
+            sides.append(0)
+    points = np.array(coords, dtype=np.float32).reshape(len(frames), 2, NUM_LANDMARKS, 3)
+    return points, np.array(sides, dtype=np.float32).reshape(len(frames), 2)
+
+def features_from_arrays(points, sides):
+    """Build feature rows from recorded point and side arrays, for training
+
+    Matches frame_feature_row() row for row; also returns a mask of frames with hands.
+    """
+    points = np.asarray(points, dtype=np.float64)[..., :2]
+    sides = np.asarray(sides, dtype=np.float64)
+
+    # Put the left hand in slot 0 and the right hand in slot 1
+    swap = (sides[:, 0] > 0) & (sides[:, 1] < 0)
+    if swap.any():
+        points, sides = points.copy(), sides.copy()
+        points[swap] = points[swap][:, ::-1]
+        sides[swap] = sides[swap][:, ::-1]
+    present = sides != 0
+    two_hands = present[:, 1]
+
+    # Distances are in units of the wrist-to-middle-knuckle length; x-based
+    # features are flipped for right hands so both hands read alike
+    scale = np.linalg.norm(points[:, :, 9] - points[:, :, 0], axis=-1)
+    scale[scale == 0] = 1e-6
+    inv = present / scale
+    outward = -sides * inv
+    tips, joints = points[:, :, TIP_IDS], points[:, :, JOINT_IDS]
+    fingers = np.concatenate([
+        ((tips[:, :, 0, 0] - joints[:, :, 0, 0]) * outward)[..., None],
+        (joints[:, :, 1:, 1] - tips[:, :, 1:, 1]) * inv[..., None],
+    ], axis=2)
+    hands = np.concatenate([
+        fingers,
+        (fingers > 0).sum(axis=2, keepdims=True),
+        (np.linalg.norm(tips[:, :, 0] - tips[:, :, 1], axis=-1) * inv)[..., None],
+        ((tips[:, :, 1, 0] - points[:, :, 0, 0]) * outward)[..., None],
+    ], axis=2)
+
+    index = points[:, :, 8]
+    pair_inv = two_hands * 2.0 / scale.sum(axis=1)
+    offset = index[:, 1] - index[:, 0]
+    features = np.concatenate([
+        hands.reshape(len(points), -1),
+        present,
+        (offset[:, 0] * pair_inv)[:, None],
+        (np.linalg.norm(offset, axis=-1) * pair_inv)[:, None],
+    ], axis=1)
+    return features, present[:, 0]
+
+def _hand_features(hand_landmarks, label):
+    """Feature values of one hand, plus its scale and index tip position"""
+    lm = hand_landmarks.landmark
+    wrist, knuckle, thumb, index = lm[0], lm[9], lm[4], lm[8]
+    wrist_x, thumb_x, index_x, index_y = wrist.x, thumb.x, index.x, index.y
+    scale = hypot(knuckle.x - wrist_x, knuckle.y - wrist.y) or 1e-6
+    inv = 1.0 / scale
+    outward = inv if label == "Left" else -inv
+    thumb_up = (thumb_x - lm[3].x) * outward
+    index_up = (lm[6].y - index_y) * inv
+    middle_up = (lm[10].y - lm[12].y) * inv
+    ring_up = (lm[14].y - lm[16].y) * inv
+    pinky_up = (lm[18].y - lm[20].y) * inv
+    return [
+        thumb_up, index_up, middle_up, ring_up, pinky_up,
+        (thumb_up > 0) + (index_up > 0) + (middle_up > 0) + (ring_up > 0) + (pinky_up > 0),
+        hypot(thumb_x - index_x, thumb.y - index_y) * inv,
+        (index_x - wrist_x) * outward,
+    ], scale, index_x, index_y
+
+def frame_feature_row(hand_data):
+    """Feature row of one frame, or None unless it has one or two hands"""
+    if len(hand_data) == 1:
+        row = _hand_features(*hand_data[0])[0]
+        row += _ONE_HAND_TAIL
+        return row
+    if len(hand_data) != 2:
+        return None
+    first, second = hand_data
+    if first[1] != "Left" and second[1] == "Left":
+        first, second = second, first
+    row, scale1, x1, y1 = _hand_features(*first)
+    values, scale2, x2, y2 = _hand_features(*second)
+    pair_inv = 2.0 / (scale1 + scale2)
+    row += values
+    row += (1.0, 1.0, (x2 - x1) * pair_inv, hypot(x2 - x1, y2 - y1) * pair_inv)
+    return row
+
+class TreeGestureClassifier:
+    """Decision tree gesture classifier over frame feature rows
+
+    Nodes are stored as flat arrays (feature, threshold, left, right, label);
+    leaves have feature -1. Leaves whose training samples agree less than
+    min_confidence predict None.
+    """
+
+    def __init__(self, max_depth=12, min_samples_leaf=2, min_confidence=None):
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.min_confidence = min_confidence
+        self.classes = np.array([], dtype=str)
+        self._set_nodes(np.full(1, -1), np.zeros(1), np.zeros(1, int), np.zeros(1, int),
+                        np.full(1, -1), np.zeros(1))
+
+    def _set_nodes(self, feature, threshold, left, right, value, confidence):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.value = np.asarray(value, dtype=np.intp)
+        self.confidence = np.asarray(confidence, dtype=np.float64)
+        classes = self.classes.tolist()
+        labels = [classes[v] if v >= 0 else None for v in self.value.tolist()]
+        if self.min_confidence is not None:
+            labels = [None if c < self.min_confidence else label
+                      for label, c in zip(labels, self.confidence.tolist())]
+        self._labels = np.array(labels, dtype=object)
+        self._nodes = (self.feature.tolist(), self.threshold.tolist(), self.left.tolist(),
+                       self.right.tolist(), labels)
+        # Children always come after their parent, so one pass finds every depth
+        depth = np.zeros(len(self.feature), dtype=np.intp)
+        for node in np.flatnonzero(self.feature >= 0):
+            depth[[self.left[node], self.right[node]]] = depth[node] + 1
+        self.depth = int(depth.max())
+
+    def fit(self, features, labels):
+        """Grow the tree on labeled feature rows"""
+        features = np.asarray(features, dtype=np.float64)
+        self.classes, targets = np.unique(np.asarray(labels), return_inverse=True)
+        onehot = np.eye(len(self.classes))[targets]
+        nodes = []  # [feature, threshold, left, right, value, confidence]; children fill slots 2 and 3
+        stack = [(np.arange(len(targets)), 0, None)]
+        while stack:
+            idx, depth, parent = stack.pop()
+            node = len(nodes)
+            if parent is not None:
+                nodes[parent[0]][parent[1]] = node
+            counts = onehot[idx].sum(axis=0)
+            nodes.append([-1, 0.0, 0, 0, int(counts.argmax()), counts.max() / len(idx)])
+            split = None
+            if depth < self.max_depth and counts.max() < len(idx):
+                split = self._best_split(features[idx], onehot[idx])
+            if split is None:
+                continue
+            feature, threshold = split
+            goes_left = features[idx, feature] <= threshold
+            nodes[node][:2] = feature, threshold
+            stack.append((idx[~goes_left], depth + 1, (node, 3)))
+            stack.append((idx[goes_left], depth + 1, (node, 2)))
+        self._set_nodes(*zip(*nodes))
+        return self
+
+    def _best_split(self, features, onehot):
+        """(feature, threshold) with the lowest weighted Gini impurity, or None"""
+        n = len(features)
+        leaf = max(self.min_samples_leaf, 1)
+        if n < 2 * leaf:
+            return None
+        sizes = np.arange(1, n)[:, None]
+        best, best_split = np.inf, None
+        for feature in range(features.shape[1]):
+            order = np.argsort(features[:, feature], kind="stable")
+            values = features[order, feature]
+            left = np.cumsum(onehot[order], axis=0)[:-1]
+            right = left[-1] + onehot[order[-1]] - left
+            impurity = (n - (left ** 2).sum(axis=1) / sizes[:, 0]
+                        - (right ** 2).sum(axis=1) / (n - sizes[:, 0]))
+            # Only split between distinct values and keep min_samples_leaf on each side
+            impurity[values[1:] <= values[:-1]] = np.inf
+            impurity[:leaf - 1] = np.inf
+            impurity[n - leaf:] = np.inf
+            i = int(impurity.argmin())
+            if impurity[i] < best:
+                best, best_split = impurity[i], (feature, (values[i] + values[i + 1]) / 2)
+        return best_split
+
+    def predict(self, features):
+        """Predict a label (or None when rejected) for each feature row, walking all rows together"""
+        features = np.atleast_2d(np.asarray(features, dtype=np.float64))
+        rows = np.arange(len(features))
+        node = np.zeros(len(features), dtype=np.intp)
+        for _ in range(self.depth):
+            feature = self.feature[node]
+            goes_left = features[rows, np.maximum(feature, 0)] <= self.threshold[node]
+            node = np.where(feature < 0, node, np.where(goes_left, self.left[node], self.right[node]))
+        return self._labels[node].tolist()
+
+    def classify(self, frames):
+        """Classify a batch of frames, each a list of (hand_landmarks, label)
+
+        Frame by frame: copying landmark messages into arrays for predict()
+        costs more per frame than the whole list walk, at any batch size.
+        """
+        return [self.classify_frame(hand_data) for hand_data in frames]
+
+    def classify_frame(self, hand_data):
+        """Classify the hands of a single frame"""
+        row = frame_feature_row(hand_data)
+        if row is None:
+            return None
+        # Walk plain lists; per-element NumPy indexing would cost more than the whole walk
+        feature, threshold, left, right, labels = self._nodes
+        node = 0
+        while feature[node] >= 0:
+            node = left[node] if row[feature[node]] <= threshold[node] else right[node]
+        return labels[node]
+
+    def save(self, path):
+        """Save the model to a .npz file"""
+        np.savez_compressed(
+            path,
+            classes=self.classes,
+            feature=self.feature,
+            threshold=self.threshold,
+            left=self.left,
+            right=self.right,
+            value=self.value,
+            confidence=self.confidence,
+            min_confidence=np.nan if self.min_confidence is None else self.min_confidence,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load a model saved with save()"""
+        with np.load(path) as data:
+            min_confidence = float(data["min_confidence"])
+            model = cls(min_confidence=None if np.isnan(min_confidence) else min_confidence)
+            model.classes = data["classes"]
+            model._set_nodes(data["feature"], data["threshold"], data["left"], data["right"],
+                             data["value"], data["confidence"])
+            return model
+
+def load_classifier(path):
+    """Load a trained model, or return None to keep the rule-based recognizer"""
+    if not path:
+        return None
+    if not os.path.exists(path):
+        print(f"Warning: Gesture model '{path}' not found, using rule-based recognition.")
+        return None
+    try:
+        classifier = TreeGestureClassifier.load(path)
+        print(f"Loaded gesture model '{path}' ({len(classifier.feature)} nodes, {len(classifier.classes)} gestures)")
+        return classifier
+    except Exception as e:
+        print(f"Warning: Could not load gesture model '{path}': {e}")
+        return None
+
+def load_samples(paths):
+    """Load and concatenate recorded sample files"""
+    points, sides, labels = [], [], []
+    for path in paths:
+        with np.load(path) as data:
+            points.append(data["points"])
+            sides.append(data["sides"])
+            labels.append(data["labels"])
+    return np.concatenate(points), np.concatenate(sides), np.concatenate(labels)
+
+def record_samples(output_path, camera=0):
+    """Record labeled frames from the webcam while a gesture key is held"""
+    import cv2 as cv
+    import mediapipe as mp
+
+    mp_drawing = mp.solutions.drawing_utils
+    mp_hands = mp.solutions.hands
+    hands = mp_hands.Hands(max_num_hands=2, min_detection_confidence=0.85, min_tracking_confidence=0.85)
+
+    frames, labels = [], []
+    cap = cv.VideoCapture(camera)
+    if not cap.isOpened():
+        print("Error: Could not open webcam!")
+        return
+    print("Hold a gesture and keep its key pressed to record it.")
+    print("Keys: 0-9 + - * / = ( ) . ^(power) d(del) c(clear) x(exit), 'q'/ESC to save and quit")
+    try:
+        while True:
+            success, image = cap.read()
+            if not success:
+                print("Error: Could not read frame!")
+                break
+            image = cv.flip(image, 1)
+            result_hands = hands.process(cv.cvtColor(image, cv.COLOR_BGR2RGB))
+            hand_data = []
+            if result_hands.multi_hand_landmarks and result_hands.multi_handedness:
+                for hand_landmarks, hand_handedness in zip(result_hands.multi_hand_landmarks, result_hands.multi_handedness):
+                    hand_data.append((hand_landmarks, hand_handedness.classification[0].label))
+                    mp_drawing.draw_landmarks(image, hand_landmarks, mp_hands.HAND_CONNECTIONS)
+            cv.putText(image, f'Samples: {len(labels)}',
+                      (10, 50), cv.FONT_HERSHEY_SIMPLEX, 0.8, (255, 0, 0), 2)
+            cv.imshow("Gesture Recorder", image)
+
+            key = cv.waitKey(1) & 0xFF
+            if key == ord('q') or key == 27:
+                break
+            if key in RECORD_KEYS and hand_data:
+                frames.append(hand_data)
+                labels.append(RECORD_KEYS[key])
+    finally:
+        cap.release()
+        cv.destroyAllWindows()
+
+    if not labels:
+        print("No samples recorded.")
+        return
+    points, sides = hands_to_arrays(frames)
+    labels = np.array(labels)
+    if os.path.exists(output_path):
+        old_points, old_sides, old_labels = load_samples([output_path])
+        points = np.concatenate([old_points, points])
+        sides = np.concatenate([old_sides, sides])
+        labels = np.concatenate([old_labels, labels])
+    np.savez_compressed(output_path, points=points, sides=sides, labels=labels)
+    print(f"Saved {len(labels)} samples to '{output_path}'")
+
+def train(sample_paths, model_path, max_depth=12, min_samples_leaf=2, min_confidence=None, holdout=0.2, seed=0):
+    """Train a classifier from recorded samples and save it"""
+    points, sides, labels = load_samples(sample_paths)
+    features, valid = features_from_arrays(points, sides)
+    features, labels = features[valid], labels[valid]
+    for label in np.unique(labels):
+        print(f"  {label:>6}: {np.count_nonzero(labels == label)} samples")
+
+    # Estimate accuracy on a random holdout before fitting on everything
+    order = np.random.default_rng(seed).permutation(len(labels))
+    n_test = int(len(labels) * holdout)
+    if n_test:
+        test, fit = order[:n_test], order[n_test:]
+        model = TreeGestureClassifier(max_depth, min_samples_leaf, min_confidence).fit(features[fit], labels[fit])
+        accuracy = np.mean(np.array(model.predict(features[test]), dtype=object) == labels[test])
+        print(f"Holdout accuracy: {accuracy:.1%} on {n_test} frames")
+
+    model = TreeGestureClassifier(max_depth, min_samples_leaf, min_confidence).fit(features, labels)
+    model.save(model_path)
+    print(f"Saved model with {len(model.feature)} nodes (depth {model.depth}) to '{model_path}'")
+
+def benchmark(model_path, sample_paths, repeats=5, max_frames=1000):
+    """Compare per-frame cost of the trained model with the rule-based recognizer
+
+    Frames are rebuilt as MediaPipe landmark messages, the objects both
+    recognizers receive in the frame loop.
+    """
+    from mediapipe.framework.formats import landmark_pb2
+    from mathSolver import count_fingers, detect_gesture
+
+    model = TreeGestureClassifier.load(model_path)
+    points, sides, labels = load_samples(sample_paths)
+    frames = []
+    for frame_points, frame_sides in zip(points[:max_frames], sides[:max_frames]):
+        hand_data = []
+        for hand, side in zip(frame_points, frame_sides):
+            if side:
+                landmarks = landmark_pb2.NormalizedLandmarkList()
+                for x, y, z in hand.tolist():
+                    landmarks.landmark.add(x=x, y=y, z=z)
+                hand_data.append((landmarks, "Left" if side < 0 else "Right"))
+        if hand_data:
+            frames.append(hand_data)
+
+    def rules(hand_data):
+        if len(hand_data) == 1:
+            return count_fingers(*hand_data[0])
+        return detect_gesture(hand_data[0], hand_data[1])
+
+    timings = {}
+    for name, fn in (("rules", lambda: [rules(f) for f in frames]),
+                     ("model", lambda: model.classify(frames))):
+        best = np.inf
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best / len(frames) * 1e6
+        print(f"{name:>16}: {timings[name]:.1f} µs/frame")
+    return timings
+
+def main():
+    """Command line entry point for recording, training and benchmarking"""
+    parser = argparse.ArgumentParser(description="Train the landmark gesture classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="record labeled frames from the webcam")
+    rec.add_argument("output", help="sample file (.npz), appended to if it exists")
+    rec.add_argument("--camera", type=int, default=0)
+
+    trn = sub.add_parser("train", help="train a model from recorded samples")
+    trn.add_argument("samples", nargs="+", help="recorded sample files")
+    trn.add_argument("--model", default="gesture_model.npz")
+    trn.add_argument("--max-depth", type=int, default=12)
+    trn.add_argument("--min-samples-leaf", type=int, default=2)
+    trn.add_argument("--min-confidence", type=float, default=None,
+                     help="reject frames whose leaf agrees less than this (0-1)")
+
+    bench = sub.add_parser("bench", help="compare per-frame cost with the rule-based recognizer")
+    bench.add_argument("model")
+    bench.add_argument("samples", nargs="+")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record_samples(args.output, args.camera)
+    elif args.command == "train":
+        train(args.samples, args.model, args.max_depth, args.min_samples_leaf, args.min_confidence)
+    else:
+        benchmark(args.model, args.samples)
+
+if __name__ == "__main__":
+    main()
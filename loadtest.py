@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Load test for the Hand Gesture Math Solver web app
+Streams a prerecorded gesture video from N local WebRTC peers through the
+same processing track webrtc_streamer uses for MathSolverTransformer and
+records per-session fps, frame drops, end-to-end latency and host load
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from fractions import Fraction
+import numpy as np
+import av
+from aiortc import MediaStreamTrack, RTCConfiguration, RTCPeerConnection
+from streamlit_webrtc.process import AsyncVideoProcessTrack
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    print("Warning: psutil not installed, host CPU/memory will not be recorded.")
+    PSUTIL_AVAILABLE = False
+
+from app import MathSolverTransformer, TARGET_PROCESS_FPS
+
+# Frame numbers are stamped as a black/white bar code along the bottom rows.
+# The bits are written twice, mirrored, so the code survives the horizontal
+# flip in MathSolverTransformer.
+STAMP_BITS = 16
+STAMP_HEIGHT = 16
+VIDEO_CLOCK_RATE = 90000
+VIDEO_TIME_BASE = Fraction(1, VIDEO_CLOCK_RATE)
+
+def _stamp_edges(width):
+    """Column boundaries of the bar code blocks"""
+    return (np.arange(2 * STAMP_BITS + 1) * width) // (2 * STAMP_BITS)
+
+def stamp_frame(img, seq):
+    """Write a frame number into the bottom rows of a BGR image"""
+    bits = [(seq >> i) & 1 for i in range(STAMP_BITS)]
+    edges = _stamp_edges(img.shape[1])
+    for i, bit in enumerate(bits + bits[::-1]):
+        img[-STAMP_HEIGHT:, edges[i]:edges[i + 1]] = 255 if bit else 0
+
+def read_stamp(img):
+    """Read a frame number written by stamp_frame, or None if it is unreadable"""
+    edges = _stamp_edges(img.shape[1])
+    centers = (edges[:-1] + edges[1:]) // 2
+    levels = img[-STAMP_HEIGHT // 2, centers].mean(axis=-1)
+    bits = levels > 127
+    if np.any(np.abs(levels - 127) < 64) or not np.array_equal(bits, bits[::-1]):
+        return None
+    return int(np.dot(bits[:STAMP_BITS], 1 << np.arange(STAMP_BITS)))
+
+def load_video(path, max_frames):
+    """Decode a video into memory so every peer replays it without decoding cost"""
+    frames = []
+    with av.open(path) as container:
+        stream = container.streams.video[0]
+        fps = float(stream.average_rate or 30)
+        for frame in container.decode(stream):
+            frames.append(frame.to_ndarray(format="bgr24"))
+            if len(frames) >= max_frames:
+                break
+    if not frames:
+        raise ValueError(f"No video frames found in '{path}'")
+    return frames, fps
+
+class LoopingVideoTrack(MediaStreamTrack):
+    """Client-side track replaying in-memory frames in real time, with stamps"""
+    kind = "video"
+
+    def __init__(self, frames, fps):
+        super().__init__()
+        self.frames = frames
+        self.fps = fps
+        self.sent = 0
+        self.sent_at = {}
+        self._start = None
+
+    async def recv(self):
+        if self._start is None:
+            self._start = time.monotonic()
+        wait = self._start + self.sent / self.fps - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        seq = self.sent % (1 << STAMP_BITS)
+        img = self.frames[self.sent % len(self.frames)].copy()
+        stamp_frame(img, seq)
+        frame = av.VideoFrame.from_ndarray(img, format="bgr24")
+        frame.pts = int(self.sent * VIDEO_CLOCK_RATE / self.fps)
+        frame.time_base = VIDEO_TIME_BASE
+        self.sent_at[seq] = time.monotonic()
+        self.sent += 1
+        return frame
+
+class Session:
+    """One client/server peer pair streaming the video through the app transformer"""
+
+    def __init__(self, index, frames, fps, process_fps):
+        self.index = index
+        self.source = LoopingVideoTrack(frames, fps)
+        self.transformer = MathSolverTransformer()
+        self.transformer.target_fps = process_fps
+        self.client = RTCPeerConnection(RTCConfiguration(iceServers=[]))
+        self.server = RTCPeerConnection(RTCConfiguration(iceServers=[]))
+        self.latencies = []
+        self.measuring = False
+        self._last_seq = None
+        self._tasks = []
+        self._mark = None
+
+    async def start(self):
+        """Negotiate the loopback connection the same way webrtc_streamer does"""
+        @self.server.on("track")
+        def on_server_track(track):
+            if track.kind == "video":
+                self.server.addTrack(AsyncVideoProcessTrack(track, self.transformer))
+
+        @self.client.on("track")
+        def on_client_track(track):
+            self._tasks.append(asyncio.ensure_future(self._consume(track)))
+
+        self.client.addTrack(self.source)
+        await self.client.setLocalDescription(await self.client.createOffer())
+        await self.server.setRemoteDescription(self.client.localDescription)
+        await self.server.setLocalDescription(await self.server.createAnswer())
+        await self.client.setRemoteDescription(self.server.localDescription)
+
+    async def _consume(self, track):
+        """Read processed frames back on the client and measure their age"""
+        while True:
+            try:
+                frame = await track.recv()
+            except Exception:
+                return
+            seq = read_stamp(frame.to_ndarray(format="bgr24"))
+            # The processing track repeats its last output until a new one is ready
+            if seq is None or seq == self._last_seq:
+                continue
+            self._last_seq = seq
+            sent_at = self.source.sent_at.pop(seq, None)
+            if self.measuring and sent_at is not None:
+                self.latencies.append((time.monotonic() - sent_at) * 1000)
+
+    def _counters(self):
+        stats = self.transformer.stats()
+        return (self.source.sent, stats["received"], stats["processed"], stats["dropped"],
+                stats["decimated"], stats["busy_time"])
+
+    def begin(self):
+        """Start the measurement window"""
+        self._mark = (time.monotonic(), self._counters())
+        self.latencies = []
+        self.measuring = True
+
+    def finish(self):
+        """End the measurement window and return this session's metrics"""
+        self.measuring = False
+        start, before = self._mark
+        sent, received, processed, dropped, decimated, busy = (
+            now - then for now, then in zip(self._counters(), before))
+        elapsed = time.monotonic() - start
+        return {
+            "session": self.index,
+            "sent": sent,
+            "received": received,
+            "processed": processed,
+            "dropped": dropped,
+            "decimated": decimated,
+            "processed_fps": processed / elapsed,
+            "drop_rate": dropped / received if received else None,
+            "decimation_rate": decimated / received if received else None,
+            "transform_ms": busy / processed * 1000 if processed else None,
+            "latency_ms": _percentiles(self.latencies),
+        }
+
+    async def close(self):
+        await self.client.close()
+        await self.server.close()
+        for task in self._tasks:
+            task.cancel()
+
+def _percentiles(values):
+    """Mean, median and 95th percentile of a list, or None when empty"""
+    if not values:
+        return None
+    values = np.asarray(values)
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "samples": int(len(values)),
+    }
+
+async def sample_host(samples, interval, stop):
+    """Record process/system CPU and process memory until stop is set"""
+    process = psutil.Process()
+    process.cpu_percent(None)
+    psutil.cpu_percent(None)
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        samples.append((process.cpu_percent(None), psutil.cpu_percent(None), process.memory_info().rss))
+
+def summarize_host(samples):
+    """Aggregate host samples into a report entry"""
+    if not samples:
+        return None
+    process_cpu, system_cpu, rss = (np.array(col, dtype=float) for col in zip(*samples))
+    return {
+        "process_cpu_percent": float(process_cpu.mean()),
+        "system_cpu_percent": float(system_cpu.mean()),
+        "rss_mb_mean": float(rss.mean() / 2**20),
+        "rss_mb_max": float(rss.max() / 2**20),
+    }
+
+def summarize_sessions(results):
+    """Aggregate per-session metrics for one load level"""
+    fps = [r["processed_fps"] for r in results]
+    drops = [r["drop_rate"] for r in results if r["drop_rate"] is not None]
+    latency = {key: [r["latency_ms"][key] for r in results if r["latency_ms"]] for key in ("p50", "p95")}
+    return {
+        "fps_mean": float(np.mean(fps)),
+        "fps_min": float(np.min(fps)),
+        "fps_total": float(np.sum(fps)),
+        "drop_rate_mean": float(np.mean(drops)) if drops else None,
+        "latency_p50_ms": float(np.median(latency["p50"])) if latency["p50"] else None,
+        "latency_p95_ms": float(np.max(latency["p95"])) if latency["p95"] else None,
+    }
+
+async def run_level(count, frames, fps, process_fps, warmup, duration):
+    """Run count concurrent sessions and measure them after a warm-up period"""
+    sessions = [Session(i, frames, fps, process_fps) for i in range(count)]
+    try:
+        await asyncio.gather(*(s.start() for s in sessions))
+        await asyncio.sleep(warmup)
+
+        samples, stop = [], asyncio.Event()
+        sampler = asyncio.ensure_future(sample_host(samples, 0.5, stop)) if PSUTIL_AVAILABLE else None
+        for session in sessions:
+            session.begin()
+        await asyncio.sleep(duration)
+        results = [session.finish() for session in sessions]
+        stop.set()
+        if sampler:
+            await sampler
+    finally:
+        await asyncio.gather(*(s.close() for s in sessions))
+    return {
+        "sessions": count,
+        "summary": summarize_sessions(results),
+        "host": summarize_host(samples) if PSUTIL_AVAILABLE else None,
+        "per_session": results,
+    }
+
+def describe_build():
+    """Identify the code and host a report was produced on"""
+    try:
+        revision = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                                  text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        revision = "unknown"
+    return {
+        "revision": revision,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def _fmt(value, spec):
+    return "-" if value is None else format(value, spec)
+
+def print_report(report):
+    """Print one line per load level"""
+    print(f"\n{'users':>5} {'fps/user':>9} {'min fps':>8} {'drops':>7} {'p50 ms':>8} {'p95 ms':>8} {'cpu %':>7} {'rss MB':>8}")
+    for level in report["levels"]:
+        s, h = level["summary"], level["host"] or {}
+        print(f"{level['sessions']:>5} {_fmt(s['fps_mean'], '9.1f')} {_fmt(s['fps_min'], '8.1f')} "
+              f"{_fmt(s['drop_rate_mean'], '7.1%')} {_fmt(s['latency_p50_ms'], '8.0f')} "
+              f"{_fmt(s['latency_p95_ms'], '8.0f')} {_fmt(h.get('process_cpu_percent'), '7.0f')} "
+              f"{_fmt(h.get('rss_mb_max'), '8.0f')}")
+
+def print_comparison(old, new):
+    """Print metric changes between two reports for matching load levels"""
+    print(f"\nComparison with {old['build']['revision']} ({old['build']['date']}):")
+    old_levels = {level["sessions"]: level for level in old["levels"]}
+    metrics = [("summary", "fps_mean"), ("summary", "drop_rate_mean"), ("summary", "latency_p50_ms"),
+               ("summary", "latency_p95_ms"), ("host", "process_cpu_percent"), ("host", "rss_mb_max")]
+    for level in new["levels"]:
+        previous = old_levels.get(level["sessions"])
+        if previous is None:
+            continue
+        changes = []
+        for section, key in metrics:
+            before = (previous.get(section) or {}).get(key)
+            after = (level.get(section) or {}).get(key)
+            if before is not None and after is not None:
+                changes.append(f"{key} {before:.3g} -> {after:.3g}")
+        print(f"  {level['sessions']} users: " + ", ".join(changes))
+
+async def run(args):
+    frames, fps = load_video(args.video, args.max_frames)
+    if args.fps:
+        fps = args.fps
+    print(f"Loaded {len(frames)} frames at {fps:.1f} fps from '{args.video}'")
+    report = {"build": describe_build(), "video": os.path.basename(args.video), "fps": fps,
+              "process_fps": args.process_fps,
+              "warmup": args.warmup, "duration": args.duration, "levels": []}
+    for count in args.sessions:
+        print(f"Running {count} session(s) for {args.duration:.0f}s...")
+        report["levels"].append(await run_level(count, frames, fps, args.process_fps, args.warmup, args.duration))
+    return report
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Load test the web app with synthetic WebRTC clients")
+    parser.add_argument("video", help="prerecorded gesture video streamed by every client")
+    parser.add_argument("--sessions", default="1,2,4,8",
+                        type=lambda s: [int(n) for n in s.split(",")],
+                        help="comma separated numbers of concurrent sessions (default 1,2,4,8)")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds before measuring each level")
+    parser.add_argument("--fps", type=float, default=None, help="override the video frame rate")
+    parser.add_argument("--process-fps", type=float, default=TARGET_PROCESS_FPS,
+                        help=f"server-side recognition rate per session (default {TARGET_PROCESS_FPS})")
+    parser.add_argument("--max-frames", type=int, default=900, help="frames of the video kept in memory")
+    parser.add_argument("--output", default="loadtest_report.json")
+    parser.add_argument("--compare", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\nReport saved to '{args.output}'")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
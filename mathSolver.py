@@ -4,6 +4,12 @@ import numpy as np
 import time
 import pyttsx3
 import sys
+import os
+import argparse
+from gesture_classifier import load_classifier, DIGITS
+from profiler import SamplingProfiler, install_signal_toggle, PROFILE_SECONDS
+from multi_user import UserTracker
+from event_log import EventLog, EVENT_DB, new_session_id
 
 # Initialize text-to-speech engine
 try:
@@ -27,19 +33,70 @@ def speak(text):
 # MediaPipe setup
 mp_drawing = mp.solutions.drawing_utils
 mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(
-    max_num_hands=2, 
-    min_detection_confidence=0.85,  # Increased confidence
-    min_tracking_confidence=0.85   # Increased confidence
-)
+
+# Multi-user detection: most users the detector was checked to find every hand of
+MAX_USERS = 4
+MULTI_USER_DETECTION_CONFIDENCE = 0.5
+
+def create_hands(max_users=1, multi_user=None):
+    """Create the hand detector, two hands per user
+
+    Users share palm detection (run once per frame, and only while fewer
+    hands than max_num_hands are tracked); the landmark model still runs
+    once per tracked hand, so that part grows with the number of users.
+    With several users each hand is small in the frame, so multi_user
+    (default: max_users > 1) lowers the palm detection confidence and uses
+    the lite models, which find small hands more reliably.
+    """
+    if multi_user is None:
+        multi_user = max_users > 1
+    if multi_user:
+        return mp_hands.Hands(
+            max_num_hands=2 * max_users,
+            model_complexity=0,
+            min_detection_confidence=MULTI_USER_DETECTION_CONFIDENCE,
+            min_tracking_confidence=0.85
+        )
+    return mp_hands.Hands(
+        max_num_hands=2 * max_users, 
+        min_detection_confidence=0.85,  # Increased confidence
+        min_tracking_confidence=0.85   # Increased confidence
+    )
 
 # Buffer for gesture debouncing
 GESTURE_BUFFER_SIZE = 3
-last_gestures = []
-last_digit = None
-last_hand_pos = None
 MOVEMENT_THRESHOLD = 0.03  # Only accept digit if hand is relatively still
 
+class UserState:
+    """Expression and debouncing state of one user"""
+    def __init__(self, events=None):
+        self.expression = ""
+        self.result = ""
+        self.last_update_time = 0
+        self.last_gestures = []
+        self.last_digit = None
+        self.last_hand_pos = None
+        self.events = events      # EventRecorder, or None when not logging
+        self.started_at = None    # Time of the first token of the current expression
+    
+    def append(self, token, current_time):
+        """Append a digit or operator to the expression"""
+        if self.started_at is None:
+            self.started_at = current_time
+        self.expression += str(token)
+        self.log_gesture(token)
+    
+    def log_gesture(self, token):
+        """Record an accepted gesture in the event log"""
+        if self.events is not None:
+            self.events.gesture(token, self.expression)
+    
+    def reset_tracking(self):
+        """Forget debouncing state when the user's hands leave the frame"""
+        self.last_hand_pos = None
+        self.last_digit = None
+        self.last_gestures = []
+
 def euclidean_distance(p1, p2):
     """Calculate Euclidean distance between two points"""
     return np.sqrt((p1.x - p2.x) ** 2 + (p1.y - p2.y) ** 2)
@@ -103,6 +160,89 @@ def detect_gesture(hand1_data, hand2_data):
         return "clear"
     return None
 
+def recognize(groups, classifier=None):
+    """Recognize one token per group of hands (one model call for all groups)"""
+    if classifier is not None:
+        return classifier.classify(groups)
+    tokens = []
+    for hand_data in groups:
+        if len(hand_data) == 1:
+            tokens.append(count_fingers(*hand_data[0]))
+        elif len(hand_data) == 2:
+            tokens.append(detect_gesture(hand_data[0], hand_data[1]))
+        else:
+            tokens.append(None)
+    return tokens
+
+def update_user(user, hand_data, token, current_time, delay, name=""):
+    """Apply a recognized token to a user's expression, returns "exit" on the exit gesture"""
+    prefix = f"{name}: " if name else ""
+    
+    if len(hand_data) == 1:
+        hand_center = hand_data[0][0].landmark[0]
+        # Calculate hand movement
+        if user.last_hand_pos is not None:
+            movement = np.sqrt((hand_center.x - user.last_hand_pos[0])**2 + (hand_center.y - user.last_hand_pos[1])**2)
+        else:
+            movement = 0
+        user.last_hand_pos = (hand_center.x, hand_center.y)
+    
+    # Single hand detection for digits (0-5 by rules, 0-9 by a trained model)
+    if len(hand_data) == 1 and str(token) in DIGITS:
+        # Only accept digit if hand is relatively still
+        if (token is not None and 
+            current_time - user.last_update_time > delay and
+            movement < MOVEMENT_THRESHOLD):
+            if user.last_digit != token:
+                user.last_digit = token
+                user.last_update_time = current_time
+                user.append(token, current_time)
+                print(f"{prefix}Added digit: {token}")
+    
+    # Two hand detection for operations and multi-digit numbers; a trained
+    # model's other one-hand labels (operators, commands) are debounced the same way
+    elif len(hand_data) in (1, 2):
+        # Debounce: Only accept gesture if it appears in 3 consecutive frames
+        user.last_gestures.append(token)
+        if len(user.last_gestures) > GESTURE_BUFFER_SIZE:
+            user.last_gestures.pop(0)
+        if (token and user.last_gestures.count(token) == GESTURE_BUFFER_SIZE and
+            current_time - user.last_update_time > delay):
+            if token == "clear":
+                user.expression = ""
+                user.result = ""
+                user.started_at = None
+                user.log_gesture(token)
+                print(f"{prefix}Cleared expression")
+            elif token == "del":
+                user.expression = user.expression[:-1]
+                user.log_gesture(token)
+                print(f"{prefix}Deleted last character")
+            elif token == "=":
+                try:
+                    user.result = str(eval(user.expression))
+                    ok = True
+                    print(f"{prefix}Result: {user.result}")
+                    speak(f"Result is {user.result}")
+                except Exception as e:
+                    user.result = "Error"
+                    ok = False
+                    print(f"{prefix}Evaluation error: {e}")
+                if user.events is not None:
+                    duration = current_time - user.started_at if user.started_at is not None else None
+                    user.events.result(user.expression, user.result, ok, duration)
+                user.started_at = None
+            elif token == "exit":
+                user.log_gesture(token)
+                print(f"{prefix}Exit gesture detected!")
+                return "exit"
+            else:
+                user.append(token, current_time)
+                print(f"{prefix}Added operation: {token}")
+            user.last_update_time = current_time
+            user.last_gestures = []
+    return None
+
 def print_instructions():
     """Print usage instructions"""
     print("\n" + "="*60)
@@ -123,33 +263,53 @@ def print_instructions():
     print("  • 2 + 5 fingers: Digit 7")
     print("  • 3 + 5 fingers: Digit 8")
     print("  • 4 + 5 fingers: Digit 9")
+    print("\nTrained Model:")
+    print("  • Run with --model gesture_model.npz (or set GESTURE_MODEL)")
+    print("    to recognize gestures with a model trained by gesture_classifier.py")
     print("\nControls:")
     print("  • Press 'q' or ESC to quit")
     print("  • Press 'c' to clear")
+    print(f"  • Press 'p' to profile the frame loop for {PROFILE_SECONDS:.0f}s (or send SIGUSR1)")
     print("  • Hold gestures steady for 1-2 seconds")
+    print("\nMulti-User:")
+    print("  • Run with --users N to serve up to N users side by side on one camera")
+    print("  • Each user keeps their own expression; the exit gesture resets it")
     print("="*60 + "\n")
 
-def main():
+def main(classifier=None, max_users=1, event_log=None):
     """Main function for the standalone math solver"""
     print_instructions()
+    print(f"Gesture recognizer: {'trained model' if classifier is not None else 'rules'}")
     
     # Initialize variables
-    last_finger_count = None
-    last_update_time = 0
     delay = 1.25
-    expression = ""
-    result = ""
-    global last_gestures, last_digit, last_hand_pos
+    hands = create_hands(max_users)
+    session = new_session_id()
+    
+    def new_user(user_id):
+        return UserState(event_log.recorder(session, user_id) if event_log is not None else None)
+    
+    user = new_user(1)
+    tracker = UserTracker(max_users, new_user) if max_users > 1 else None
+    if tracker is not None:
+        print(f"Multi-user mode: up to {max_users} users")
+    extra_hands = 0
+    
+    # Sampling profiler for this frame loop, idle until toggled
+    profiler = SamplingProfiler()
+    install_signal_toggle(profiler)
     
     # Initialize webcam
     cap = cv.VideoCapture(0)
-    if not cap.isOpened():
-        print("Error: Could not open webcam!")
-        return
-    
-    print("Starting camera... Press 'q' to quit.")
     
     try:
+        # Inside the try so the event log is closed on this path too
+        if not cap.isOpened():
+            print("Error: Could not open webcam!")
+            return
+        
+        print("Starting camera... Press 'q' to quit.")
+        
         while True:
             success, image = cap.read()
             if not success:
@@ -172,74 +332,59 @@ def main():
                     label = hand_handedness.classification[0].label
                     hand_data.append((hand_landmarks, label))
                     mp_drawing.draw_landmarks(image, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-                
-                # Single hand detection for digits 0-5
-                if len(hand_data) == 1:
-                    hand_landmarks, label = hand_data[0]
-                    fingers_up = count_fingers(hand_landmarks, label)
-                    # Calculate hand movement
-                    hand_center = hand_landmarks.landmark[0]
-                    if last_hand_pos is not None:
-                        movement = np.sqrt((hand_center.x - last_hand_pos[0])**2 + (hand_center.y - last_hand_pos[1])**2)
-                    else:
-                        movement = 0
-                    last_hand_pos = (hand_center.x, hand_center.y)
-                    # Only accept digit if hand is relatively still
-                    if (fingers_up in [0, 1, 2, 3, 4, 5] and 
-                        current_time - last_update_time > delay and
-                        movement < MOVEMENT_THRESHOLD):
-                        if last_digit != fingers_up:
-                            last_digit = fingers_up
-                            last_update_time = current_time
-                            expression += str(fingers_up)
-                            print(f"Added digit: {fingers_up}")
-                
-                # Two hand detection for operations and multi-digit numbers
-                if len(hand_data) == 2:
-                    gesture = detect_gesture(hand_data[0], hand_data[1])
-                    # Debounce: Only accept gesture if it appears in 3 consecutive frames
-                    last_gestures.append(gesture)
-                    if len(last_gestures) > GESTURE_BUFFER_SIZE:
-                        last_gestures.pop(0)
-                    if (gesture and last_gestures.count(gesture) == GESTURE_BUFFER_SIZE and
-                        current_time - last_update_time > delay):
-                        if gesture == "clear":
-                            expression = ""
-                            result = ""
-                            print("Cleared expression")
-                        elif gesture == "del":
-                            expression = expression[:-1]
-                            print("Deleted last character")
-                        elif gesture == "=":
-                            try:
-                                result = str(eval(expression))
-                                print(f"Result: {result}")
-                                speak(f"Result is {result}")
-                            except Exception as e:
-                                result = "Error"
-                                print(f"Evaluation error: {e}")
-                        elif gesture == "exit":
-                            print("Exit gesture detected!")
-                            break
-                        else:
-                            expression += gesture
-                            print(f"Added operation: {gesture}")
-                        last_update_time = current_time
-                        last_gestures = []
+            
+            # Group hands per user, then recognize every group in one call
+            if tracker is not None:
+                groups = [(tracked.state, hands_of_user, f"User {tracked.id}")
+                          for tracked, hands_of_user in tracker.assign(hand_data, current_time)]
+                for tracked in tracker.lost:
+                    print(f"Warning: lost User {tracked.id}, no hands seen for {tracker.timeout:.0f}s; "
+                          f"expression '{tracked.state.expression}' dropped")
+                if tracker.unassigned and not extra_hands:
+                    print(f"Warning: {tracker.unassigned} hand(s) ignored, all {max_users} users are taken")
+                extra_hands = tracker.unassigned
+            elif hand_data:
+                groups = [(user, hand_data, "")]
             else:
-                last_hand_pos = None
-                last_digit = None
-                last_gestures = []
+                groups = []
+                user.reset_tracking()
+            tokens = recognize([group for _, group, _ in groups], classifier)
+            
+            exit_requested = False
+            for (state, group, name), token in zip(groups, tokens):
+                if update_user(state, group, token, current_time, delay, name) == "exit":
+                    if tracker is None:
+                        exit_requested = True
+                    else:
+                        # Other users keep going; only this user's input is reset
+                        state.expression = ""
+                        state.result = ""
+                        state.started_at = None
+                        state.reset_tracking()
+                        state.last_update_time = current_time
+            if exit_requested:
+                break
             
             # Display expression and result on the frame
-            cv.putText(image, f'Expression: {expression}', 
-                      (10, 50), cv.FONT_HERSHEY_SIMPLEX, 0.8, (255, 0, 0), 2)
-            cv.putText(image, f'Result: {result}', 
-                      (10, 100), cv.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
+            if tracker is None:
+                cv.putText(image, f'Expression: {user.expression}', 
+                          (10, 50), cv.FONT_HERSHEY_SIMPLEX, 0.8, (255, 0, 0), 2)
+                cv.putText(image, f'Result: {user.result}', 
+                          (10, 100), cv.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
+            else:
+                for tracked in tracker.users:
+                    x = max(10, min(int(tracked.center[0] * image.shape[1]) - 80, image.shape[1] - 200))
+                    cv.putText(image, f'User {tracked.id}: {tracked.state.expression}', 
+                              (x, 50), cv.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+                    cv.putText(image, f'= {tracked.state.result}', 
+                              (x, 80), cv.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
             
             # Display instructions on frame
-            cv.putText(image, "Press 'q' to quit, 'c' to clear", 
+            cv.putText(image, "Press 'q' to quit, 'c' to clear, 'p' to profile", 
                       (10, image.shape[0] - 20), cv.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+            if profiler.running:
+                cv.putText(image, "PROFILING", 
+                          (image.shape[1] - 140, 30), cv.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
             
             # Show the frame
             cv.imshow("Hand Gesture Math Solver", image)
@@ -249,9 +394,13 @@ def main():
             if key == ord('q') or key == 27:  # 'q' or ESC
                 break
             elif key == ord('c'):
-                expression = ""
-                result = ""
+                for state in [user] + [tracked.state for tracked in (tracker.users if tracker else [])]:
+                    state.expression = ""
+                    state.result = ""
+                    state.started_at = None
                 print("Cleared via keyboard")
+            elif key == ord('p'):
+                profiler.toggle()
     
     except KeyboardInterrupt:
         print("\nInterrupted by user")
@@ -261,7 +410,95 @@ def main():
         # Clean up
         cap.release()
         cv.destroyAllWindows()
+        if event_log is not None:
+            event_log.close()
         print("Math Solver closed.")
 
+def benchmark_users(video, max_users, classifier=None, max_frames=300):
+    """Per-frame cost of one shared pipeline for max_users users against one pipeline per user
+
+    The separate pipelines each get an equal vertical strip of the frame, as
+    if every user had their own camera.
+    """
+    cap = cv.VideoCapture(video)
+    frames = []
+    while len(frames) < max_frames:
+        success, image = cap.read()
+        if not success:
+            break
+        frames.append(cv.flip(image, 1))
+    cap.release()
+    if not frames:
+        print(f"Error: Could not read frames from '{video}'!")
+        return None
+    
+    def detect(hands, image):
+        result = hands.process(cv.cvtColor(image, cv.COLOR_BGR2RGB))
+        if not (result.multi_hand_landmarks and result.multi_handedness):
+            return []
+        return [(lm, h.classification[0].label) for lm, h in zip(result.multi_hand_landmarks, result.multi_handedness)]
+    
+    def shared(pipelines):
+        hands, = pipelines
+        tracker = UserTracker(max_users, lambda user_id: UserState())
+        for image in frames:
+            hand_data = detect(hands, image)
+            groups = tracker.assign(hand_data, time.time())
+            recognize([group for _, group in groups], classifier)
+            yield len(hand_data)
+    
+    def separate(pipelines):
+        for image in frames:
+            found = 0
+            width = image.shape[1] // max_users
+            for i, hands in enumerate(pipelines):
+                hand_data = detect(hands, image[:, i * width:(i + 1) * width])
+                recognize([hand_data], classifier)
+                found += len(hand_data)
+            yield found
+    
+    # Same detector settings on both sides; pipelines are built and warmed up
+    # outside the timed region
+    multi_user = max_users > 1
+    timings = {}
+    hands_found = {}
+    for name, run, pipelines in ((f"1 pipeline, {max_users} users", shared,
+                                  [create_hands(max_users, multi_user)]),
+                                 (f"{max_users} pipelines, 1 user each", separate,
+                                  [create_hands(1, multi_user) for _ in range(max_users)])):
+        for hands in pipelines:
+            detect(hands, frames[0])
+        start = time.perf_counter()
+        found = list(run(pipelines))
+        timings[name] = (time.perf_counter() - start) / len(frames) * 1000
+        hands_found[name] = np.mean(found)
+        for hands in pipelines:
+            hands.close()
+        print(f"{name:>28}: {timings[name]:6.1f} ms/frame, {hands_found[name]:.1f} hands/frame")
+    shared_found, separate_found = hands_found.values()
+    if shared_found < separate_found - 0.5:
+        print(f"Warning: the shared pipeline lost {separate_found - shared_found:.1f} hands/frame; "
+              f"its timing is not comparable")
+    return timings
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Hand Gesture Math Solver")
+    parser.add_argument("--model", default=os.environ.get("GESTURE_MODEL"),
+                        help="trained gesture model (.npz); rule-based recognition is used when omitted")
+    parser.add_argument("--users", type=int, default=1,
+                        help="number of users sharing the camera (default 1)")
+    parser.add_argument("--events", default=EVENT_DB,
+                        help=f"SQLite file for usage events (default {EVENT_DB})")
+    parser.add_argument("--no-events", action="store_true", help="do not record usage events")
+    parser.add_argument("--bench", metavar="VIDEO",
+                        help="compare --users N in one pipeline with N separate pipelines on a video, then exit")
+    args = parser.parse_args()
+    if args.users > MAX_USERS:
+        print(f"Warning: hands of more than {MAX_USERS} users are not reliably detected in one pass; "
+              f"using --users {MAX_USERS}")
+    users = min(max(1, args.users), MAX_USERS)
+    if args.bench:
+        benchmark_users(args.bench, users, load_classifier(args.model))
+        sys.exit(0)
+    main(classifier=load_classifier(args.model), max_users=users,
+         event_log=None if args.no_events else EventLog(args.events))
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""
+Multi-user support for Hand Gesture Math Solver
+Groups the hands found in one detection pass into per-user pairs using
+where each user's hands were last seen (continuity) and, for new users,
+left/right hands close to each other (spatial pairing)
+"""
+
+import numpy as np
+
+PAIR_DISTANCE = 0.35   # Max wrist distance between a user's left and right hand
+MATCH_DISTANCE = 0.15  # Max wrist movement of a tracked hand between frames
+USER_TIMEOUT = 5.0     # Seconds before an absent user and their expression are dropped
+
+def wrist_positions(hand_data):
+    """Normalized (x, y) wrist position of each (hand_landmarks, label)"""
+    return np.array([(h.landmark[0].x, h.landmark[0].y) for h, _ in hand_data], dtype=float).reshape(-1, 2)
+
+def pair_hands(wrists, labels, max_distance=PAIR_DISTANCE):
+    """Pair left and right hands closest first; returns lists of hand indices"""
+    n = len(wrists)
+    labels = np.asarray(labels)
+    dist = np.linalg.norm(wrists[:, None] - wrists[None], axis=-1)
+    candidates = np.triu((labels[:, None] != labels[None]) & (dist < max_distance))
+    used = set()
+    groups = []
+    for a, b in sorted(zip(*np.nonzero(candidates)), key=lambda ab: dist[ab]):
+        if a not in used and b not in used:
+            used.update((a, b))
+            groups.append([int(a), int(b)])
+    groups.extend([i] for i in range(n) if i not in used)
+    return groups
+
+class TrackedUser:
+    """A user in front of the camera and their solver state"""
+
+    def __init__(self, user_id, state, now):
+        self.id = user_id
+        self.state = state
+        self.positions = {}  # Last wrist position per hand label
+        self.last_seen = now
+
+    @property
+    def center(self):
+        """Mean of the user's last known wrist positions"""
+        return np.mean(list(self.positions.values()), axis=0)
+
+class UserTracker:
+    """Assigns the hands of each frame to users and keeps per-user state
+
+    state_factory is called with the new user's id and returns their state.
+    """
+
+    def __init__(self, max_users, state_factory, pair_distance=PAIR_DISTANCE,
+                 match_distance=MATCH_DISTANCE, timeout=USER_TIMEOUT):
+        self.max_users = max_users
+        self.state_factory = state_factory
+        self.pair_distance = pair_distance
+        self.match_distance = match_distance
+        self.timeout = timeout
+        self.users = []
+        self.lost = []        # Users dropped by the last assign
+        self.unassigned = 0   # Hands of the last assign left over with max_users taken
+        self._next_id = 1
+
+    def _match_costs(self, wrists, labels):
+        """Cost of giving each hand to each tracked user; below 1 is a match
+
+        A hand is compared with the same hand's last position, or with the
+        user's other hand when that is the only one seen so far.
+        """
+        costs = np.full((len(wrists), len(self.users)), np.inf)
+        for u, user in enumerate(self.users):
+            for h, (wrist, label) in enumerate(zip(wrists, labels)):
+                if label in user.positions:
+                    costs[h, u] = np.linalg.norm(wrist - user.positions[label]) / self.match_distance
+                elif user.positions:
+                    other = next(iter(user.positions.values()))
+                    costs[h, u] = np.linalg.norm(wrist - other) / self.pair_distance
+        return costs
+
+    def assign(self, hand_data, now):
+        """Group hand_data per user; returns [(TrackedUser, hand_data subset)] ordered by user id"""
+        wrists = wrist_positions(hand_data)
+        labels = [label for _, label in hand_data]
+        groups = {}
+
+        # Continuity: hands go to the user they are closest to, one hand per label
+        costs = self._match_costs(wrists, labels)
+        free = set(range(len(hand_data)))
+        for flat in np.argsort(costs, axis=None):
+            h, u = np.unravel_index(flat, costs.shape)
+            if costs[h, u] >= 1:
+                break
+            taken = groups.get(u, [])
+            if h in free and len(taken) < 2 and all(labels[t] != labels[h] for t in taken):
+                groups[u] = taken + [h]
+                free.discard(h)
+
+        # Spatial pairing: the remaining hands become new users
+        free = sorted(free)
+        self.unassigned = 0
+        for group in pair_hands(wrists[free], [labels[i] for i in free], self.pair_distance):
+            if len(self.users) >= self.max_users:
+                self.unassigned += len(group)
+                continue
+            self.users.append(TrackedUser(self._next_id, self.state_factory(self._next_id), now))
+            self._next_id += 1
+            groups[len(self.users) - 1] = [free[i] for i in group]
+
+        assigned = []
+        for u, user in enumerate(self.users):
+            if u in groups:
+                for h in groups[u]:
+                    user.positions[labels[h]] = wrists[h]
+                user.last_seen = now
+                assigned.append((user, [hand_data[h] for h in groups[u]]))
+            else:
+                user.state.reset_tracking()
+        self.lost = [user for user in self.users if now - user.last_seen > self.timeout]
+        self.users = [user for user in self.users if now - user.last_seen <= self.timeout]
+        return assigned
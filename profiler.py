@@ -0,0 +1,102 @@
+"""
+On-demand sampling profiler for the frame loop
+Samples one thread's Python stack at a fixed interval for a fixed window and
+writes collapsed stacks ("outer;inner count" lines) for flamegraph.pl,
+speedscope or inferno. Nothing runs while the profiler is idle.
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_SECONDS = 10.0
+SAMPLE_INTERVAL = 0.005
+PROFILE_DIR = "profiles"
+
+def frame_name(frame):
+    """Flamegraph label for a stack frame"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """Samples a thread's stack from a background thread for a fixed window"""
+
+    def __init__(self, duration=PROFILE_SECONDS, interval=SAMPLE_INTERVAL, output_dir=PROFILE_DIR):
+        self.duration = duration
+        self.interval = interval
+        self.output_dir = output_dir
+        self.last_output = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, thread_id=None):
+        """Start sampling thread_id (default: the calling thread); False if already running"""
+        if self.running:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(thread_id or threading.get_ident(),),
+            name="sampling-profiler",
+            daemon=True,
+        )
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """End the sampling window early; the profile collected so far is still written"""
+        self._stop.set()
+
+    def toggle(self, thread_id=None):
+        """Start profiling, or stop it if a window is already running"""
+        if self.running:
+            self.stop()
+        else:
+            self.start(thread_id)
+
+    def _run(self, thread_id):
+        counts = Counter()
+        deadline = time.monotonic() + self.duration
+        print(f"Profiling for {self.duration:g}s...")
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                break  # Target thread has exited
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            counts[";".join(reversed(stack))] += 1
+        self.last_output = self._write(counts)
+
+    def _write(self, counts):
+        """Write collapsed stacks and return the file path"""
+        if not counts:
+            print("Profiler collected no samples.")
+            return None
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+            with open(path, "w") as f:
+                for stack, count in counts.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            print(f"Profiler Error: {e}")
+            return None
+        print(f"Profile saved to '{path}' ({sum(counts.values())} samples)")
+        return path
+
+def install_signal_toggle(profiler, thread_id=None, signum=getattr(signal, "SIGUSR1", None)):
+    """Toggle profiling of thread_id on a signal (SIGUSR1 by default, where available)"""
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+    thread_id = thread_id or threading.get_ident()
+    signal.signal(signum, lambda *_: profiler.toggle(thread_id))
+    return True